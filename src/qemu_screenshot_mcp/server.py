@@ -1,25 +1,120 @@
 import asyncio
+import atexit
 import os
-import psutil
-import json
-import base64
+import sys
+import shutil
 import tempfile
+import threading
 import io
-import datetime
+import mmap
+import re
+import time
 from pathlib import Path
 from PIL import Image
 from mcp.server.fastmcp import FastMCP
 from mcp.types import TextContent, ImageContent
 
+try:
+    import orjson
+    _json_dumps = orjson.dumps
+    _json_loads = orjson.loads
+except ImportError:
+    # orjson has no wheel for some platforms; the stdlib is slower but speaks the same bytes
+    import json
+
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(',', ':')).encode()
+
+    _json_loads = json.loads
+
+try:
+    from pybase64 import b64encode_as_string as _b64encode_str
+except ImportError:
+    # SIMD base64 is a speedup only; the stdlib produces identical output
+    import base64
+
+    def _b64encode_str(data):
+        return base64.b64encode(data).decode('ascii')
+
+try:
+    # Linux only: lets run_and_screenshot wait for the QMP socket without polling
+    from asyncinotify import Inotify, Mask
+except ImportError:
+    Inotify = None
+
+try:
+    # Optional (the "x11" extra): query X11 in-process instead of spawning xprop per window
+    from Xlib import X, Xatom, display as xdisplay
+    from Xlib.error import XError
+except ImportError:
+    xdisplay = None
+
 # Initialize FastMCP server
 mcp = FastMCP("QEMU Screenshot")
 
+# External capture tools, resolved once: missing ones are skipped instead of fork-and-fail each call
+_XPROP = shutil.which("xprop")
+_SPECTACLE = shutil.which("spectacle")
+_IMPORT = shutil.which("import")
+_LAST_DESKTOP_TOOL = None # Whichever of the above last captured the desktop successfully
+
+# One X connection kept open across lookups (python-xlib path only), so each capture skips the
+# connect + auth handshake. Lookups run in worker threads, hence the lock.
+_X_DISPLAY = None
+_X_LOCK = threading.Lock()
+
+def _find_qemu_window_xlib():
+    """Find the QEMU window over a single, reused X connection using python-xlib."""
+    global _X_DISPLAY
+    with _X_LOCK:
+        if _X_DISPLAY is None:
+            _X_DISPLAY = xdisplay.Display()
+        d = _X_DISPLAY
+        try:
+            root = d.screen().root
+            client_list = root.get_full_property(d.intern_atom('_NET_CLIENT_LIST'), X.AnyPropertyType)
+            if client_list is None:
+                return None
+            for wid in client_list.value:
+                try:
+                    wm_class = d.create_resource_object('window', wid).get_full_property(Xatom.WM_CLASS, X.AnyPropertyType)
+                except XError:
+                    continue # Window went away while we were looking
+                if wm_class is None:
+                    continue
+                value = wm_class.value
+                if isinstance(value, str):
+                    value = value.encode()
+                if b'qemu' in bytes(value).lower():
+                    return hex(wid)
+            return None
+        except Exception:
+            # Connection is unusable (e.g. X server restarted); reconnect on the next lookup
+            _X_DISPLAY = None
+            try:
+                d.close()
+            except Exception:
+                pass
+            raise
+
 async def find_qemu_window_id():
     """Find the X window ID of the QEMU instance."""
+    if not os.environ.get("DISPLAY"):
+        return None # Headless or Wayland-only: X11 lookups can only fail
+
+    if xdisplay is not None:
+        try:
+            return await asyncio.to_thread(_find_qemu_window_xlib)
+        except Exception:
+            pass # Fall back to xprop below
+
+    if _XPROP is None:
+        return None
+
     try:
         # 1. Get list of window IDs
         process = await asyncio.create_subprocess_exec(
-            "xprop", "-root", "_NET_CLIENT_LIST",
+            _XPROP, "-root", "_NET_CLIENT_LIST",
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.PIPE
         )
@@ -34,37 +129,82 @@ async def find_qemu_window_id():
         
         ids = [id.strip() for id in line.split("#")[1].split(",")]
         
-        # 2. Check each window for QEMU class
-        for window_id in ids:
+        # 2. Check each window for QEMU class, with all xprop queries in flight at once
+        async def has_qemu_class(window_id):
             p = await asyncio.create_subprocess_exec(
-                "xprop", "-id", window_id, "WM_CLASS",
+                _XPROP, "-id", window_id, "WM_CLASS",
                 stdout=asyncio.subprocess.PIPE,
                 stderr=asyncio.subprocess.PIPE
             )
-            out, _ = await p.communicate()
-            if p.returncode == 0 and "qemu" in out.decode().lower():
-                return window_id
+            try:
+                out, _ = await p.communicate()
+            except asyncio.CancelledError:
+                if p.returncode is None:
+                    p.kill()
+                await p.wait()
+                raise
+            return p.returncode == 0 and "qemu" in out.decode().lower()
+
+        checks = [asyncio.ensure_future(has_qemu_class(window_id)) for window_id in ids]
+        try:
+            # Await in client-list order so the first QEMU window still wins
+            for window_id, check in zip(ids, checks):
+                if await check:
+                    return window_id
+        finally:
+            # A QEMU window was found (or we failed); reap the xprops still running
+            for check in checks:
+                check.cancel()
+            await asyncio.gather(*checks, return_exceptions=True)
                 
     except Exception:
         pass
     return None
 
+# On Linux, read process info straight from /proc instead of going through psutil
+USE_PROCFS = sys.platform.startswith('linux') and os.path.isdir('/proc')
+
+def _scan_proc_for_qemu():
+    """Linux fast path: read /proc/<pid>/cmdline directly instead of building psutil objects."""
+    processes = []
+    with os.scandir('/proc') as entries:
+        for entry in entries:
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry.name}/cmdline', 'rb') as f:
+                    raw = f.read()
+            except OSError:
+                # Process exited or is not ours to inspect
+                continue
+            # Match argv[0] or any argument like the psutil path does; comm is not enough since
+            # `-name guest,process=...` renames the QEMU process. One search over the NUL-separated
+            # buffer is equivalent and only the few matches get split and decoded.
+            if b'qemu-system-' in raw:
+                processes.append({"pid": int(entry.name), "cmdline": [os.fsdecode(arg) for arg in raw.split(b'\0')[:-1]]})
+    return processes
+
 def find_qemu_processes():
-    """Find all running qemu-system-* processes."""
+    """Find all running qemu-system-* processes as {"pid": ..., "cmdline": [...]} dicts."""
+    if USE_PROCFS:
+        return _scan_proc_for_qemu()
+
+    import psutil # Only a dependency off Linux, so only imported here
+
     processes = []
     for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
         try:
             name = proc.info.get('name') or ""
             cmdline = proc.info.get('cmdline') or []
             if name.startswith('qemu-system-') or any('qemu-system-' in arg for arg in cmdline):
-                processes.append(proc)
+                processes.append({"pid": proc.pid, "cmdline": cmdline})
         except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
             pass
     return processes
 
 def get_qmp_socket_path(proc):
     """Extract QMP socket path from qemu process cmdline."""
-    cmdline = proc.info.get('cmdline') or []
+    cmdline = proc["cmdline"]
     for i, arg in enumerate(cmdline):
         if arg == '-qmp' and i + 1 < len(cmdline):
             val = cmdline[i + 1]
@@ -74,43 +214,227 @@ def get_qmp_socket_path(proc):
             return arg[len('-qmp=unix:'):].split(',')[0]
     return None
 
+# Last QMP target found by a process scan, so repeat captures skip the scan entirely.
+# Revalidated on every use from that one PID's cmdline; a recycled PID won't carry the same -qmp.
+_QMP_CACHE = {}
+
+def _read_cmdline(pid):
+    """Return a process's argv; raises OSError if it is gone or unreadable."""
+    if USE_PROCFS:
+        with open(f'/proc/{pid}/cmdline', 'rb') as f:
+            return [os.fsdecode(arg) for arg in f.read().split(b'\0')[:-1]]
+    import psutil
+    try:
+        return psutil.Process(pid).cmdline()
+    except psutil.Error as e:
+        raise OSError(str(e)) from e
+
+def _get_cached_qmp_socket():
+    """Return the cached QMP socket path if its QEMU process is still alive and still serving it."""
+    cached = _QMP_CACHE.get("default")
+    if cached is None:
+        return None
+    pid, socket_path = cached
+    try:
+        cmdline = _read_cmdline(pid)
+    except OSError:
+        cmdline = []
+    if get_qmp_socket_path({"pid": pid, "cmdline": cmdline}) != socket_path or not os.path.exists(socket_path):
+        del _QMP_CACHE["default"]
+        return None
+    return socket_path
+
+def _cache_qmp_socket(proc, socket_path):
+    """Remember the QEMU process and QMP socket found by the last scan."""
+    _QMP_CACHE["default"] = (proc["pid"], socket_path)
+
+# screendump needs a real path; keep the scratch file on tmpfs where available so it never hits disk
+SCRATCH_DIR = "/dev/shm" if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK) else None
+
+# Screenshot filename timestamps (time.strftime works on the C struct_time; no datetime object)
+TIMESTAMP_FORMAT = "%Y%m%d_%H%M%S"
+
 # TEAM_001 BREADCRUMB: CONFIRMED - QMP operations need timeout to prevent hanging
 QMP_TIMEOUT_SECONDS = 5
 
+# Pooled QMP connections left unused this long are closed rather than held open indefinitely
+QMP_IDLE_SECONDS = 60
+
+# Open QMP connections keyed by socket path, reused so each command skips the greeting and
+# qmp_capabilities handshake. The socket inode is kept so a restarted QEMU gets a fresh connection.
+_QMP_CAPABILITIES = b'{"execute":"qmp_capabilities"}\n'
+_QMP_QUIT = b'{"execute":"quit"}\n'
+_QMP_SCREENDUMP_PREFIX = b'{"execute":"screendump","arguments":{"filename":'
+_QMP_CONNS = {}
+_QMP_LOCKS = {}
+_QMP_LOOP = None
+_QMP_IDLE_TIMERS = {}
+_QMP_PNG_SUPPORT = {} # socket_path -> whether that QEMU's screendump accepts format=png
+
+async def _qmp_read_reply(reader):
+    """Read the next command reply, skipping asynchronous QMP events (caller sets the deadline)."""
+    while True:
+        try:
+            line = await reader.readuntil(b'\n')
+        except asyncio.IncompleteReadError:
+            raise ConnectionResetError("QMP connection closed by QEMU") from None
+        msg = _json_loads(line)
+        if "event" not in msg:
+            return msg
+
+async def _qmp_connect(socket_path):
+    """
+    Return a (reader, writer, reused) QMP connection for socket_path, opening one if needed.
+    A fresh connection has consumed the greeting but still needs qmp_capabilities.
+    """
+    conn = _QMP_CONNS.get(socket_path)
+    if conn is not None:
+        reader, writer, inode = conn
+        if not writer.is_closing() and not reader.at_eof() and os.stat(socket_path).st_ino == inode:
+            return reader, writer, True
+        _qmp_drop(socket_path)
+
+    inode = os.stat(socket_path).st_ino
+    # TEAM_001: Added timeout to prevent indefinite blocking (one deadline for connect + greeting)
+    async with asyncio.timeout(QMP_TIMEOUT_SECONDS):
+        reader, writer = await asyncio.open_unix_connection(socket_path)
+        try:
+            await reader.readuntil(b'\n')
+        except BaseException:
+            writer.close()
+            raise
+    _QMP_CONNS[socket_path] = (reader, writer, inode)
+    return reader, writer, False
+
+def _qmp_drop(socket_path):
+    """Close and forget the pooled connection for socket_path, if any."""
+    _QMP_PNG_SUPPORT.pop(socket_path, None) # May be a different QEMU next time
+    timer = _QMP_IDLE_TIMERS.pop(socket_path, None)
+    if timer is not None:
+        timer.cancel()
+    conn = _QMP_CONNS.pop(socket_path, None)
+    if conn is not None:
+        try:
+            conn[1].close()
+        except RuntimeError:
+            pass # Owning event loop already closed
+
+def _qmp_idle_close(socket_path):
+    """Timer callback: close a pooled connection that has sat unused for QMP_IDLE_SECONDS."""
+    lock = _QMP_LOCKS.get(socket_path)
+    if lock is not None and lock.locked():
+        return # A command is in flight; it re-arms the timer when done
+    _qmp_drop(socket_path)
+
+@atexit.register
+def _close_qmp_connections():
+    for socket_path in list(_QMP_CONNS):
+        _qmp_drop(socket_path)
+
+def _screendump_frame(filename, fmt=None):
+    """Build a screendump frame by splicing the (JSON-escaped) filename into a fixed prefix."""
+    suffix = b',"format":"' + fmt.encode() + b'"}}\n' if fmt else b'}}\n'
+    return _QMP_SCREENDUMP_PREFIX + _json_dumps(filename) + suffix
+
 async def qmp_command(socket_path, command, args=None):
-    """Execute a QMP command with timeout protection."""
-    try:
-        # TEAM_001: Added timeout to prevent indefinite blocking
-        reader, writer = await asyncio.wait_for(
-            asyncio.open_unix_connection(socket_path),
-            timeout=QMP_TIMEOUT_SECONDS
-        )
-    except asyncio.TimeoutError:
-        return {"error": {"desc": f"Connection to QMP socket timed out after {QMP_TIMEOUT_SECONDS}s"}}
-    except Exception as e:
-        return {"error": {"desc": f"Failed to connect to QMP socket: {str(e)}"}}
-    
+    """Execute an arbitrary QMP command (slow path; hot commands use prebuilt frames with qmp_raw)."""
+    cmd = {"execute": command}
+    if args:
+        cmd["arguments"] = args
+    return await qmp_raw(socket_path, _json_dumps(cmd) + b'\n')
+
+async def qmp_raw(socket_path, frame):
+    """Send a pre-serialized QMP command frame over a pooled connection with timeout protection."""
+    global _QMP_LOOP
+    loop = asyncio.get_running_loop()
+    if loop is not _QMP_LOOP:
+        # Connections and locks are bound to the loop that created them
+        _close_qmp_connections()
+        _QMP_LOCKS.clear()
+        _QMP_LOOP = loop
+
+    # QMP answers in order, so only one command may be in flight per connection
+    lock = _QMP_LOCKS.get(socket_path)
+    if lock is None:
+        lock = _QMP_LOCKS[socket_path] = asyncio.Lock()
+    async with lock:
+        while True:
+            try:
+                reader, writer, reused = await _qmp_connect(socket_path)
+            except asyncio.TimeoutError:
+                return {"error": {"desc": f"Connection to QMP socket timed out after {QMP_TIMEOUT_SECONDS}s"}}
+            except Exception as e:
+                return {"error": {"desc": f"Failed to connect to QMP socket: {str(e)}"}}
+
+            try:
+                # A single deadline covers the whole exchange rather than a timer per read
+                async with asyncio.timeout(QMP_TIMEOUT_SECONDS):
+                    # On a fresh connection, pipeline qmp_capabilities with the command to save a round trip
+                    writer.write(frame if reused else _QMP_CAPABILITIES + frame)
+                    await writer.drain()
+                    if not reused:
+                        await _qmp_read_reply(reader)
+                    response = await _qmp_read_reply(reader)
+            except asyncio.TimeoutError:
+                _qmp_drop(socket_path)
+                return {"error": {"desc": f"QMP command timed out after {QMP_TIMEOUT_SECONDS}s"}}
+            except (ConnectionError, ValueError, asyncio.LimitOverrunError) as e:
+                _qmp_drop(socket_path)
+                if reused and frame != _QMP_QUIT:
+                    continue # Pooled connection went stale; retry once on a fresh one
+                return {"error": {"desc": f"QMP connection failed: {str(e)}"}}
+            except BaseException:
+                # Cancelled mid-command: an unread reply would desync the pooled connection
+                _qmp_drop(socket_path)
+                raise
+
+            if frame == _QMP_QUIT:
+                _qmp_drop(socket_path)
+            else:
+                timer = _QMP_IDLE_TIMERS.pop(socket_path, None)
+                if timer is not None:
+                    timer.cancel()
+                _QMP_IDLE_TIMERS[socket_path] = loop.call_later(QMP_IDLE_SECONDS, _qmp_idle_close, socket_path)
+            return response
+
+async def _qmp_screendump(socket_path):
+    """
+    Capture the guest display via QMP and return (png_data, error).
+    Asks QEMU to write PNG itself (QEMU 7.1+) and falls back to PPM + Pillow for older versions;
+    the outcome is remembered per socket for as long as its pooled connection lives.
+    """
+    with tempfile.NamedTemporaryFile(suffix=".screendump", dir=SCRATCH_DIR, delete=False) as tmp:
+        tmp_path = tmp.name
+
     try:
-        # Wrap all readline operations in timeout
-        await asyncio.wait_for(reader.readline(), timeout=QMP_TIMEOUT_SECONDS)
-        writer.write(json.dumps({"execute": "qmp_capabilities"}).encode() + b'\n')
-        await writer.drain()
-        await asyncio.wait_for(reader.readline(), timeout=QMP_TIMEOUT_SECONDS)
-        
-        cmd = {"execute": command}
-        if args:
-            cmd["arguments"] = args
-        
-        writer.write(json.dumps(cmd).encode() + b'\n')
-        await writer.drain()
-        
-        response = await asyncio.wait_for(reader.readline(), timeout=QMP_TIMEOUT_SECONDS)
-        return json.loads(response)
-    except asyncio.TimeoutError:
-        return {"error": {"desc": f"QMP command timed out after {QMP_TIMEOUT_SECONDS}s"}}
+        native_png = _QMP_PNG_SUPPORT.get(socket_path, True)
+        if native_png:
+            res = await qmp_raw(socket_path, _screendump_frame(tmp_path, "png"))
+            if "error" not in res:
+                _QMP_PNG_SUPPORT[socket_path] = True
+            elif "class" in res["error"]:
+                # Rejected by QEMU itself (errors qmp_raw makes up for timeouts etc. carry no class)
+                native_png = False
+        if not native_png:
+            # Older QEMU rejects the 'format' argument and can only write PPM
+            res = await qmp_raw(socket_path, _screendump_frame(tmp_path))
+            if "error" not in res:
+                _QMP_PNG_SUPPORT[socket_path] = False # Skip the doomed PNG attempt next time
+
+        if "error" in res:
+            return None, f"QMP screendump failed: {res['error'].get('desc', str(res['error']))}"
+
+        # screendump only replies once the file has been written
+        if not os.path.exists(tmp_path) or os.path.getsize(tmp_path) == 0:
+            return None, "Screenshot file was not created or is empty."
+
+        if native_png:
+            return Path(tmp_path).read_bytes(), None
+        # Decode + zlib encode is the heaviest step; keep it off the event loop
+        return await asyncio.to_thread(_convert_ppm_to_png, tmp_path), None
     finally:
-        writer.close()
-        await writer.wait_closed()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
 
 @mcp.tool()
 async def capture_screenshot():
@@ -118,25 +442,26 @@ async def capture_screenshot():
     Captures a screenshot of the first running QEMU instance.
     Prioritizes QMP (window-independent), falls back to X11 (if available).
     """
-    processes = find_qemu_processes()
-    if not processes:
-        return [TextContent(type="text", text="""\
+    global _LAST_DESKTOP_TOOL
+    socket_path = _get_cached_qmp_socket()
+    if socket_path is None:
+        processes = find_qemu_processes()
+        if not processes:
+            return [TextContent(type="text", text="""\
 Error: No running QEMU instance found.
 
 TIP FOR AI AGENTS:
 - QEMU must be running with a display (e.g., `-display gtk` or `-display sdl`).
 - Headless QEMU (`-display none` or `-nographic`) cannot be screenshotted via X11.
 - For headless VMs, use QMP with `-qmp unix:/tmp/qmp.sock,server,nowait`.""")]
-    
-    # Prioritize processes with QMP
-    qmp_proc = None
-    socket_path = None
-    for proc in processes:
-        path = get_qmp_socket_path(proc)
-        if path and os.path.exists(path):
-            qmp_proc = proc
-            socket_path = path
-            break
+        
+        # Prioritize processes with QMP
+        for proc in processes:
+            path = get_qmp_socket_path(proc)
+            if path and os.path.exists(path):
+                socket_path = path
+                _cache_qmp_socket(proc, path)
+                break
     
     # TEAM_001 BREADCRUMB: CONFIRMED - mkdir needs error handling
     # Prepare storage directory with error handling
@@ -149,40 +474,37 @@ TIP FOR AI AGENTS:
     except Exception as e:
         return [TextContent(type="text", text=f"Error: Failed to create screenshots directory: {str(e)}")]
     
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+    timestamp = time.strftime(TIMESTAMP_FORMAT)
     filename = f"qemu_screenshot_{timestamp}.png"
     filepath = screenshot_dir / filename
 
     if socket_path:
         # Strategy 1: QMP Screendump
-        with tempfile.NamedTemporaryFile(suffix=".ppm", delete=False) as tmp_ppm:
-            tmp_ppm_path = tmp_ppm.name
-
         try:
-            res = await qmp_command(socket_path, "screendump", {"filename": tmp_ppm_path})
-            if "error" not in res and os.path.exists(tmp_ppm_path) and os.path.getsize(tmp_ppm_path) > 0:
-                with Image.open(tmp_ppm_path) as img:
-                    img.save(filepath, format='PNG')
-                return _create_success_response(filename, filepath)
+            png_data, _ = await _qmp_screendump(socket_path)
+            if png_data:
+                filepath.write_bytes(png_data)
+                return await _create_success_response(filename, filepath, png_data)
         except Exception:
             pass # Fallback to X11 if QMP fails
-        finally:
-            if os.path.exists(tmp_ppm_path):
-                os.remove(tmp_ppm_path)
 
     # Strategy 2: X11/XWayland Targeted Fallback
     # Try to find a specific QEMU window first.
     window_id = await find_qemu_window_id()
     
     fallback_commands = []
-    if window_id:
-        fallback_commands.append(["import", "-window", window_id, str(filepath)])
+    if window_id and _IMPORT:
+        fallback_commands.append([_IMPORT, "-window", window_id, str(filepath)])
     
     # Generic fallbacks if targeted fails or window not found
-    fallback_commands.extend([
-        ["spectacle", "-b", "-n", "-o", str(filepath)],  # KDE/Wayland/X11
-        ["import", "-window", "root", str(filepath)],    # ImageMagick/X11
-    ])
+    desktop_commands = []
+    if _SPECTACLE:
+        desktop_commands.append([_SPECTACLE, "-b", "-n", "-o", str(filepath)])  # KDE/Wayland/X11
+    if _IMPORT and os.environ.get("DISPLAY"):
+        desktop_commands.append([_IMPORT, "-window", "root", str(filepath)])  # ImageMagick/X11
+    # Which tool works is a property of the session, so start with the one that worked last time
+    desktop_commands.sort(key=lambda cmd: cmd[0] != _LAST_DESKTOP_TOOL)
+    fallback_commands.extend(desktop_commands)
 
     for cmd in fallback_commands:
         try:
@@ -193,11 +515,17 @@ TIP FOR AI AGENTS:
             )
             await process.communicate()
             
-            if os.path.exists(filepath) and os.path.getsize(filepath) > 0:
-                # Add a message about how we captured it
-                method = "Targeted Window" if window_id and cmd[1] == "-window" and cmd[2] != "root" else "Desktop Capture"
-                msg = f"Screenshot captured successfully using {method}!"
-                return _create_success_response(filename, filepath, msg)
+            # The tool wrote the PNG itself (a missing or empty file raises and moves on)
+            encoded = await asyncio.to_thread(_b64encode_file, filepath)
+
+            # Add a message about how we captured it
+            if window_id and cmd[1] == "-window" and cmd[2] != "root":
+                method = "Targeted Window"
+            else:
+                method = "Desktop Capture"
+                _LAST_DESKTOP_TOOL = cmd[0]
+            msg = f"Screenshot captured successfully using {method}!"
+            return _success_response(filename, filepath, encoded, msg)
         except Exception:
             continue
 
@@ -215,11 +543,73 @@ TIP FOR AI AGENTS:
 
     return [TextContent(type="text", text="Error: Failed to capture screenshot using any available method (QMP, Targeted X11, Spectacle all failed).")]
 
-def _create_success_response(filename, filepath, message=None):
-    with open(filepath, "rb") as f:
-        png_data = f.read()
-    encoded = base64.b64encode(png_data).decode('utf-8')
-    
+def _png_compress_level():
+    """
+    zlib level for Pillow's PNG encoder, overridable with QEMU_SCREENSHOT_PNG_LEVEL (0-9).
+    Screenshots are ephemeral, so the default of 1 favours encode speed: several times faster
+    than Pillow's default of 6 and only slightly larger on screen content.
+    """
+    try:
+        level = int(os.environ.get("QEMU_SCREENSHOT_PNG_LEVEL", "1"))
+    except ValueError:
+        return 1
+    return min(max(level, 0), 9)
+
+PNG_COMPRESS_LEVEL = _png_compress_level()
+
+# Binary PPM header per netpbm: "P6", width, height, maxval as whitespace-separated tokens (with
+# optional '#' comments between them), then exactly one whitespace byte before the raster
+_PPM_SEP = rb'(?:\s|#[^\n]*\n)+'
+_PPM_HEADER = re.compile(rb'P6' + _PPM_SEP + rb'(\d+)' + _PPM_SEP + rb'(\d+)' + _PPM_SEP + rb'(\d+)\s')
+_PPM_HEADER_MAX = 1024
+
+def _load_ppm(ppm_path):
+    """
+    Load a QEMU screendump PPM without going through Pillow's format detection.
+    8-bit P6 images are decoded straight from the mapped file; anything else goes through Image.open.
+    """
+    with open(ppm_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                m = _PPM_HEADER.match(mm[:_PPM_HEADER_MAX])
+                if m:
+                    width, height, maxval = map(int, m.groups())
+                    offset = m.end()
+                    end = offset + width * height * 3
+                    if maxval == 255 and width > 0 and height > 0 and size >= end:
+                        # Decode from the page cache instead of copying the pixels into a bytes object
+                        # first. Pillow stores RGB as 4 bytes/pixel, so frombytes copies exactly once.
+                        with memoryview(mm) as view, view[offset:end] as pixels:
+                            return Image.frombytes('RGB', (width, height), pixels)
+    return Image.open(ppm_path)
+
+def _convert_ppm_to_png(ppm_path):
+    """Encode a QEMU screendump PPM as PNG bytes (encoded once, reused for disk and response)."""
+    buf = io.BytesIO()
+    with _load_ppm(ppm_path) as img:
+        img.save(buf, format='PNG', compress_level=PNG_COMPRESS_LEVEL, optimize=False)
+    return buf.getvalue()
+
+# Images at least this large are base64-encoded in a worker thread rather than on the event loop
+_B64_THREAD_THRESHOLD = 1 << 20
+
+def _b64encode_file(path):
+    """
+    Base64-encode a file straight from its mapping instead of copying it into a bytes object first.
+    Runs entirely in a worker thread, so a cancelled caller can't unmap it mid-encode.
+    """
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        return _b64encode_str(mm)
+
+async def _create_success_response(filename, filepath, png_data, message=None):
+    if len(png_data) >= _B64_THREAD_THRESHOLD:
+        encoded = await asyncio.to_thread(_b64encode_str, png_data)
+    else:
+        encoded = _b64encode_str(png_data)
+    return _success_response(filename, filepath, encoded, message)
+
+def _success_response(filename, filepath, encoded, message=None):
     if message is None:
         message = f"Screenshot captured successfully!\nFilename: {filename}\nPath: {filepath.absolute()}"
     else:
@@ -238,6 +628,35 @@ def _create_success_response(filename, filepath, message=None):
     ]
 
 
+async def _wait_for_path(path):
+    """Return once path exists, using inotify where available instead of polling."""
+    if Inotify is not None:
+        try:
+            with Inotify() as inotify:
+                inotify.add_watch(path.parent, Mask.CREATE)
+                # It may have appeared before the watch was in place
+                if path.exists():
+                    return
+                async for event in inotify:
+                    if event.name is not None and event.name.name == path.name:
+                        return
+        except OSError:
+            pass # inotify unavailable (e.g. watch limit reached); poll instead
+
+    while not path.exists():
+        await asyncio.sleep(0.1)
+
+async def _wait_for_qmp_socket(qmp_socket, qemu_proc, timeout):
+    """Wait for QEMU to create its QMP socket; False if QEMU exits or the timeout expires first."""
+    created = asyncio.ensure_future(_wait_for_path(qmp_socket))
+    exited = asyncio.ensure_future(qemu_proc.wait())
+    try:
+        await asyncio.wait({created, exited}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        return created.done() and not created.cancelled() and created.exception() is None
+    finally:
+        created.cancel()
+        exited.cancel()
+
 @mcp.tool()
 async def run_and_screenshot(
     arch: str,
@@ -315,18 +734,11 @@ async def run_and_screenshot(
             )
             
             # Wait for QMP socket to become available (with timeout)
-            socket_ready = False
-            for _ in range(50):  # 5 seconds max wait for socket
-                await asyncio.sleep(0.1)
-                if qmp_socket.exists():
-                    socket_ready = True
-                    break
+            if not await _wait_for_qmp_socket(qmp_socket, qemu_proc, timeout=5):
                 # Check if process died early
                 if qemu_proc.returncode is not None:
                     _, stderr = await qemu_proc.communicate()
                     return [TextContent(type="text", text=f"Error: QEMU exited immediately.\nCommand: {' '.join(cmd)}\nStderr: {stderr.decode()}")]
-            
-            if not socket_ready:
                 return [TextContent(type="text", text=f"Error: QMP socket did not appear within 5 seconds.\nCommand: {' '.join(cmd)}")]
             
             # Wait for the specified boot time
@@ -345,45 +757,28 @@ async def run_and_screenshot(
             except Exception as e:
                 return [TextContent(type="text", text=f"Error: Failed to create screenshots directory: {str(e)}")]
             
-            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            timestamp = time.strftime(TIMESTAMP_FORMAT)
             filename = f"qemu_{arch}_{timestamp}.png"
             filepath = screenshot_dir / filename
             
             # Take screenshot via QMP
-            with tempfile.NamedTemporaryFile(suffix=".ppm", delete=False) as tmp_ppm:
-                tmp_ppm_path = tmp_ppm.name
+            png_data, error = await _qmp_screendump(str(qmp_socket))
+            if error:
+                return [TextContent(type="text", text=f"Error: {error}")]
             
-            try:
-                res = await qmp_command(str(qmp_socket), "screendump", {"filename": tmp_ppm_path})
-                
-                if "error" in res:
-                    return [TextContent(type="text", text=f"Error: QMP screendump failed: {res['error'].get('desc', str(res['error']))}")]
-                
-                # Small delay to ensure file is written
-                await asyncio.sleep(0.2)
-                
-                if not os.path.exists(tmp_ppm_path) or os.path.getsize(tmp_ppm_path) == 0:
-                    return [TextContent(type="text", text="Error: Screenshot file was not created or is empty.")]
-                
-                # Convert PPM to PNG
-                with Image.open(tmp_ppm_path) as img:
-                    img.save(filepath, format='PNG')
-                
-                # Build success response
-                message = (
-                    f"Screenshot captured successfully!\n"
-                    f"Architecture: {arch}\n"
-                    f"Image: {image}\n"
-                    f"Boot delay: {screenshot_delay_seconds}s\n"
-                    f"Filename: {filename}\n"
-                    f"Path: {filepath.absolute()}"
-                )
-                
-                return _create_success_response(filename, filepath, message)
-                
-            finally:
-                if os.path.exists(tmp_ppm_path):
-                    os.remove(tmp_ppm_path)
+            filepath.write_bytes(png_data)
+            
+            # Build success response
+            message = (
+                f"Screenshot captured successfully!\n"
+                f"Architecture: {arch}\n"
+                f"Image: {image}\n"
+                f"Boot delay: {screenshot_delay_seconds}s\n"
+                f"Filename: {filename}\n"
+                f"Path: {filepath.absolute()}"
+            )
+            
+            return await _create_success_response(filename, filepath, png_data, message)
         
         except FileNotFoundError:
             return [TextContent(type="text", text=f"Error: QEMU binary '{qemu_binary}' not found. Is QEMU installed?")]
@@ -395,7 +790,7 @@ async def run_and_screenshot(
                 try:
                     # Try graceful shutdown via QMP first
                     if qmp_socket.exists():
-                        await qmp_command(str(qmp_socket), "quit")
+                        await qmp_raw(str(qmp_socket), _QMP_QUIT)
                         # Give it a moment to shut down gracefully
                         try:
                             await asyncio.wait_for(qemu_proc.wait(), timeout=2.0)
@@ -416,6 +811,11 @@ async def run_and_screenshot(
                         qemu_proc.kill()
                     except Exception:
                         pass
+            # The socket dies with this VM; don't keep its pooled connection (or lock) around
+            _qmp_drop(str(qmp_socket))
+            lock = _QMP_LOCKS.get(str(qmp_socket))
+            if lock is not None and not lock.locked():
+                del _QMP_LOCKS[str(qmp_socket)]
 
 
 def main():
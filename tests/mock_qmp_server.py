@@ -23,13 +23,18 @@ async def handle_client(reader, writer):
             writer.write(json.dumps({"return": {}}).encode() + b'\n')
         elif execute == "screendump":
             filename = req.get("arguments", {}).get("filename")
-            # Create a fake PPM file
-            # PPM P6 format header: P6 width height maxval
-            with open(filename, "wb") as f:
-                f.write(b"P6\n10 10\n255\n" + b"\xff\x00\x00" * 100) # 10x10 red image
+            if req.get("arguments", {}).get("format") == "png":
+                # QEMU 7.1+ can write PNG directly
+                from PIL import Image
+                Image.new("RGB", (10, 10), (255, 0, 0)).save(filename, format="PNG")
+            else:
+                # Create a fake PPM file
+                # PPM P6 format header: P6 width height maxval
+                with open(filename, "wb") as f:
+                    f.write(b"P6\n10 10\n255\n" + b"\xff\x00\x00" * 100) # 10x10 red image
             writer.write(json.dumps({"return": {}}).encode() + b'\n')
         else:
-            writer.write(json.dumps({"error": {"desc": "Unknown command"}}).encode() + b'\n')
+            writer.write(json.dumps({"error": {"class": "CommandNotFound", "desc": "Unknown command"}}).encode() + b'\n')
         
         await writer.drain()
 